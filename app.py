@@ -1,19 +1,40 @@
+import atexit
 import csv
+import logging
 import os
-from collections import defaultdict
+import queue
+import re
+import msgspec
+import orjson
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
+from types import MappingProxyType
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel
 from typing import Optional, List
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
 import uvicorn
-from langsmith import traceable
 
-from brain import app_graph
+from brain import clean_content, get_app_graph
+from tools import get_my_balance, get_my_transactions
 
-app = FastAPI()
+# Log records are only enqueued on the request path; a background listener
+# does the formatting and the (locking) stream write.
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+logger = logging.getLogger("banking_app")
+logger.addHandler(QueueHandler(_log_queue))
+logger.setLevel(os.environ.get("LOG_LEVEL", "WARNING" if os.environ.get("ENV") == "prod" else "INFO"))
+logger.propagate = False
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+app_graph = get_app_graph()
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 templates = Jinja2Templates(directory="templates")
 
@@ -26,56 +47,51 @@ if not os.path.exists("static/css"):
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
-FLOW_TREE = defaultdict(dict)
-@traceable
+FLOW_TREE = MappingProxyType({})
 def load_csv_flow():
-    """Parses the CSV into a dictionary for fast lookup."""
+    """Parses the CSV once into a read-only dictionary for fast lookup."""
     global FLOW_TREE
     csv_path = "data/menu.csv"
     
     if not os.path.exists(csv_path):
-        print("Warning: menu.csv not found.")
+        logger.warning("menu.csv not found.")
         return
 
-    with open(csv_path, mode='r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
+    tree = {}
+    with open(csv_path, mode='r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
         for row in reader:
-            step_id = row['Step_ID'].strip()
-            msg = row['Bot_Message'].strip()
-            choice = row['User_Choice'].strip()
-            next_id = row['Next_Step_ID'].strip()
+            if not row:
+                continue
+            step_id, msg, choice, next_id = (c.strip() for c in row)
 
-            if step_id not in FLOW_TREE:
-                FLOW_TREE[step_id] = {"message": msg, "options": []}
+            if step_id not in tree:
+                tree[step_id] = {"message": msg, "options": []}
             
             # If the CSV row has choices, add them
             if choice:
-                FLOW_TREE[step_id]["options"].append({
+                tree[step_id]["options"].append({
                     "label": choice,
                     "next_step": next_id
                 })
 
+    for node in tree.values():
+        node["options"] = tuple(node["options"])
+    FLOW_TREE = MappingProxyType(tree)
+
 load_csv_flow()
 
 
-class ChatRequest(BaseModel):
+class ChatRequest(msgspec.Struct):
     message: Optional[str] = ""
     session_id: str = "user_session_101"
     current_step_id: Optional[str] = None  
-@traceable
-def clean_content(content):
-    """Helper to extract clean text from LangChain message."""
-    if isinstance(content, str):
-        return content
-    if isinstance(content, list):
-        text_parts = []
-        for part in content:
-            if isinstance(part, dict) and 'text' in part:
-                text_parts.append(part['text'])
-            else:
-                text_parts.append(str(part))
-        return " ".join(text_parts)
-    return str(content)
+
+_DECODER = msgspec.json.Decoder(ChatRequest)
+
+# Graph nodes whose LLM output is never shown to the user.
+SILENT_NODES = ("gate",)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -88,9 +104,14 @@ async def home(request: Request):
         "initial_options": start_data.get("options", [])
     })
 
-@app.post("/chat")
-async def chat_endpoint(chat_request: ChatRequest):
-    user_msg = chat_request.message.strip()
+@app.post("/chat", response_model=None)
+async def chat_endpoint(request: Request):
+    try:
+        chat_request = _DECODER.decode(await request.body())
+    except msgspec.DecodeError as e:
+        return ORJSONResponse(status_code=422, content={"detail": str(e)})
+
+    user_msg = (chat_request.message or "").strip()
     step_id = chat_request.current_step_id
     thread_id = chat_request.session_id
 
@@ -100,13 +121,13 @@ async def chat_endpoint(chat_request: ChatRequest):
         
        
         if step_id == "agent_handover":
-             return JSONResponse(content={
+             return ORJSONResponse(content={
                 "response": node_data['message'],
                 "options": [], 
                 "next_step": None 
             })
 
-        return JSONResponse(content={
+        return ORJSONResponse(content={
             "response": node_data['message'],
             "options": node_data['options'],
             "next_step": None 
@@ -114,31 +135,137 @@ async def chat_endpoint(chat_request: ChatRequest):
 
 
     if not user_msg:
-         return JSONResponse(content={"response": "I didn't catch that. Could you type it again?"})
-
-    try:
-        input_msg = HumanMessage(content=user_msg)
-        config = {"configurable": {"thread_id": thread_id}}
-        
-        result = app_graph.invoke({"messages": [input_msg]}, config=config)
+         return ORJSONResponse(content={"response": "I didn't catch that. Could you type it again?"})
 
-        if result and "messages" in result and len(result["messages"]) > 0:
-            last_msg = result['messages'][-1]
-            final_response = clean_content(last_msg.content)
-        else:
-            final_response = "I encountered an error connecting to the bank systems."
+    config = thread_config(thread_id)
 
-        # Return standard response (no flow options)
-        return JSONResponse(content={
-            "response": final_response,
+    # Unambiguous account lookups are answered straight from the tools,
+    # skipping the gate and agent LLM round-trips.
+    tool_answer = match_direct_answer(user_msg)
+    if tool_answer is not None:
+        direct = await run_in_threadpool(direct_answer, tool_answer, user_msg, config)
+        return ORJSONResponse(content={
+            "response": direct,
             "options": [],
             "next_step": None
         })
 
+    # The text is already a plain str, so skip pydantic validation.
+    input_msg = HumanMessage.model_construct(content=user_msg)
+    return StreamingResponse(
+        stream_chat(input_msg, config),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+BALANCE_RE = re.compile(r"^(what('?s| is) )?(my )?(account )?balance\??$", re.IGNORECASE)
+TRANSACTIONS_RE = re.compile(r"^(show )?(me )?(my )?(recent )?transactions\??$", re.IGNORECASE)
+
+def balance_answer():
+    return get_my_balance.invoke({})
+
+def transactions_answer():
+    return "Your recent transactions:\n" + "\n".join(get_my_transactions.invoke({}))
+
+DIRECT_ANSWERS = (
+    (BALANCE_RE, balance_answer),
+    (TRANSACTIONS_RE, transactions_answer),
+)
+
+def match_direct_answer(user_msg):
+    """Returns the tool answer for a fixed balance/transaction phrasing, or None."""
+    for pattern, tool_answer in DIRECT_ANSWERS:
+        if pattern.match(user_msg):
+            return tool_answer
+    return None
+
+def direct_answer(tool_answer, user_msg, config):
+    """Answers without the agent graph, but still records the turn in its checkpoint.
+
+    Blocking (CSV reloads, SQLite write), so callers run it in the threadpool.
+    """
+    answer = tool_answer()
+    try:
+        # Later graph turns ("and the one before that?") need this exchange
+        # in their history; writing it costs no LLM call.
+        app_graph.update_state(
+            config,
+            {"messages": [HumanMessage(content=user_msg), AIMessage(content=answer)]},
+            as_node="account_bot",
+        )
+    except Exception as e:
+        logger.warning("Could not checkpoint direct answer: %s", e)
+    return answer
+
+
+@lru_cache(maxsize=4096)
+def thread_config(thread_id):
+    """Shared, read-only graph config for one chat session."""
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def sse_event(payload):
+    return f"data: {orjson.dumps(payload).decode()}\n\n"
+
+
+def stream_chat(input_msg, config):
+    """Yields the agent reply as server-sent events, one text delta at a time.
+
+    Deltas are forwarded as soon as they arrive. A message is muted from the
+    first tool_call_chunk on, so ReAct tool-calling steps never reach the
+    user; whole messages (e.g. block_bot's canned reply) are only sent if
+    their text was not already streamed.
+
+    This is a plain generator on purpose: StreamingResponse drains it in the
+    threadpool, so the synchronous graph never blocks the event loop.
+    """
+    sent = set()
+    muted = set()
+    current = None
+    try:
+        for _, (msg, metadata) in app_graph.stream(
+            {"messages": [input_msg]}, config=config, stream_mode="messages", subgraphs=True
+        ):
+            # The gate emits a structured decision, not user-facing text.
+            if metadata.get("langgraph_node") in SILENT_NODES or not isinstance(msg, AIMessage):
+                continue
+            if msg.id in muted:
+                continue
+            if msg.tool_calls or getattr(msg, "tool_call_chunks", None):
+                muted.add(msg.id)
+                continue
+            if not isinstance(msg, AIMessageChunk) and msg.id in sent:
+                continue
+            text = clean_content(msg.content)
+            if not text:
+                continue
+            # Separate messages so consecutive answers are not glued together.
+            if sent and msg.id != current:
+                text = "\n\n" + text
+            current = msg.id
+            sent.add(msg.id)
+            yield sse_event({"delta": text})
+
+        if not sent:
+            yield sse_event({"delta": "I encountered an error connecting to the bank systems."})
+
     except Exception as e:
-        print(f"❌ Server Error: {e}")
-        return JSONResponse(content={"response": "System Error: The banking assistant is currently unavailable."})
+        logger.error("Server Error: %s", e)
+        yield sse_event({"delta": "System Error: The banking assistant is currently unavailable."})
 
 
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=5009, reload=True)
\ No newline at end of file
+    if os.environ.get("ENV") == "prod":
+        uvicorn.run(
+            "app:app",
+            host="0.0.0.0",
+            port=5009,
+            workers=os.cpu_count(),
+            loop="uvloop",
+            http="httptools",
+            reload=False,
+            access_log=False,
+        )
+    else:
+        uvicorn.run("app:app", host="0.0.0.0", port=5009, reload=True)
\ No newline at end of file
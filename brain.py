@@ -1,5 +1,11 @@
+import hashlib
+import logging
 import os
+import sqlite3
 import sys
+import threading
+from collections import OrderedDict
+from functools import cache
 from typing import Literal
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field
@@ -8,12 +14,14 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langgraph.prebuilt import create_react_agent
 from langgraph.graph import StateGraph, END, START, MessagesState
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langgraph.checkpoint.memory import MemorySaver 
+from langgraph.checkpoint.sqlite import SqliteSaver
 from langsmith import traceable
 
 
 from tools import get_my_balance, get_my_transactions, get_bank_policies
 
+logger = logging.getLogger("banking_app")
+
 load_dotenv()
 if "GOOGLE_API_KEY" not in os.environ:
     print("Error: GOOGLE_API_KEY is missing from .env file.")
@@ -25,13 +33,10 @@ llm = ChatGoogleGenerativeAI(
 )
 
 
-class GuardianOutput(BaseModel):
+class GateAndRoute(BaseModel):
     is_allowed: bool = Field(..., description="True if banking related, False otherwise.")
     reason: str = Field(..., description="Reason for decision.")
-
-class RouterOutput(BaseModel):
-    destination: Literal["account_bot", "info_bot"] = Field(..., description="Target agent.")
-
+    destination: Literal["account_bot", "info_bot", "block_bot"] = Field(..., description="Target agent.")
 
 account_agent = create_react_agent(llm, tools=[get_my_balance, get_my_transactions])
 info_agent = create_react_agent(llm, tools=[get_bank_policies])
@@ -39,65 +44,99 @@ info_agent = create_react_agent(llm, tools=[get_bank_policies])
 ACCOUNT_SYS = "You are an Account Manager. Use tools for balances/transactions. Refuse non-banking queries."
 INFO_SYS = "You are a Bank Consultant. Answer fees/rates/hours. You CANNOT access accounts. Refuse non-banking queries."
 
-@traceable
-def guardian_node(state: MessagesState):
-    """Firewall Node with Crash Prevention."""
-    last_msg = state['messages'][-1]
-    
-    prompt = (
-        "You are a Banking Gateway Security System. Your job is to filter user messages."
-        "Analyze the user's input and decide if it is related to banking, finance, or account management."
-        "CRITERIA FOR 'is_allowed' (True):"
-        "- Account inquiries (e.g., 'my balance', 'how much money', 'transactions')."
-        "- General banking questions (e.g., 'fees', 'interest rates', 'hours')."
-        "- Greetings (e.g., 'hi', 'hello')."
-        "CRITERIA FOR 'is_allowed' (False):"
-        "- General knowledge questions (e.g., 'capital of France', 'python code')."
-        "- Creative writing, recipes, or personal advice unrelated to money."
-        "Provide a clear 'reason' for your decision."
-    )
-    
-    try:
-        structured_llm = llm.with_structured_output(GuardianOutput)
-        decision = structured_llm.invoke([SystemMessage(content=prompt), last_msg])
-    except Exception as e:
-        print(f"Guardian Error: {e}")
-        decision = None
+GATE_SYS = (
+    "You are the Banking Gateway. Your job is to filter the LATEST user message and route it to the correct specialist agent."
+    "Analyze the user's input and decide if it is related to banking, finance, or account management."
+    "CRITERIA FOR 'is_allowed' (True):"
+    "- Account inquiries (e.g., 'my balance', 'how much money', 'transactions')."
+    "- General banking questions (e.g., 'fees', 'interest rates', 'hours')."
+    "- Greetings (e.g., 'hi', 'hello')."
+    "CRITERIA FOR 'is_allowed' (False):"
+    "- General knowledge questions (e.g., 'capital of France', 'python code')."
+    "- Creative writing, recipes, or personal advice unrelated to money."
+    "Provide a clear 'reason' for your decision."
+    "DESTINATION RULES:"
+    "1. 'account_bot': STRICTLY for personal/private account data."
+    "   - Use for: 'my balance', 'my transactions', 'did I spend money at X', 'transfer money'."
+    "   - The user is asking about THEIR specific money."
+    "2. 'info_bot': STRICTLY for general/public bank policies."
+    "   - Use for: 'what are the fees', 'interest rates', 'opening hours', 'how do I open an account'."
+    "   - The user is asking about the BANK, not their specific money."
+    "3. 'block_bot': whenever 'is_allowed' is False."
+)
 
+gate_llm = llm.with_structured_output(GateAndRoute)
+
+
+def clean_content(content):
+    """Helper to extract clean text from LangChain message."""
+    if type(content) is str:
+        return content
+    if type(content) is list:
+        return " ".join(
+            part['text'] if type(part) is dict and 'text' in part else str(part)
+            for part in content
+        )
+    return str(content)
+
+# The gate only sees the latest turns, so the prompt stays bounded however
+# long a session's checkpointed history grows.
+GATE_WINDOW = 3
+
+def _cache_key(message):
+    """Fixed-size digest of one message's normalized text, used to key the gate cache."""
+    text = clean_content(message.content).strip().casefold()
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+_GATE_CACHE = OrderedDict()
+_GATE_CACHE_SIZE = 4096
+_GATE_CACHE_LOCK = threading.Lock()
+
+def _gate_cached(messages):
+    """Gate verdict and route, memoized on the latest user message. Failures are not cached.
+
+    The allow/deny verdict depends only on the latest message, so a cached
+    BLOCK is reused anywhere. The route also depends on earlier turns, so an
+    allowed verdict is only cached and reused for a session's opening message.
+    The LLM always sees the real messages.
+    """
+    key = _cache_key(messages[-1])
+    opening = len(messages) == 1
+    with _GATE_CACHE_LOCK:
+        hit = _GATE_CACHE.get(key)
+        if hit is not None and (opening or not hit[0]):
+            _GATE_CACHE.move_to_end(key)
+            return hit
+
+    decision = gate_llm.invoke([SystemMessage(content=GATE_SYS)] + messages)
     if decision is None:
-        print("Guardian returned None. Defaulting to BLOCK.")
-        decision = GuardianOutput(is_allowed=False, reason="System safety check failed.")
-    
-    return {"guardian_decision": decision}
+        raise ValueError("empty gate decision")
+    result = (decision.is_allowed, decision.reason, decision.destination)
+
+    if opening or not decision.is_allowed:
+        with _GATE_CACHE_LOCK:
+            _GATE_CACHE[key] = result
+            if len(_GATE_CACHE) > _GATE_CACHE_SIZE:
+                _GATE_CACHE.popitem(last=False)
+    return result
+
 @traceable
-def router_node(state: MessagesState):
-    """Router Node with Crash Prevention."""
-    messages = state['messages']
-    
-    prompt = (
-        "You are a Banking Router. Route the user message to the correct specialist agent."
-        "DESTINATION RULES:"
-        "1. 'account_bot': STRICTLY for personal/private account data."
-        "   - Use for: 'my balance', 'my transactions', 'did I spend money at X', 'transfer money'."
-        "   - The user is asking about THEIR specific money."
-        "2. 'info_bot': STRICTLY for general/public bank policies."
-        "   - Use for: 'what are the fees', 'interest rates', 'opening hours', 'how do I open an account'."
-        "   - The user is asking about the BANK, not their specific money."
-    )
+def gate_node(state: MessagesState):
+    """Firewall + Router Node with Crash Prevention, in one LLM call."""
+    messages = state['messages'][-GATE_WINDOW:]
     
     try:
-        structured_llm = llm.with_structured_output(RouterOutput)
-        decision = structured_llm.invoke([SystemMessage(content=prompt)] + messages)
+        is_allowed, reason, destination = _gate_cached(messages)
     except Exception as e:
-        print(f"Router Error: {e}")
-        decision = None
+        logger.warning("Gate Error: %s. Defaulting to BLOCK.", e)
+        is_allowed, reason, destination = False, "System safety check failed.", "block_bot"
 
-    if decision is None:
-        print("Router returned None. Defaulting to info_bot.")
-        return {"next": "info_bot"}
+    if not is_allowed:
+        destination = "block_bot"
     
-    print(f"🚦 Routing to: {decision.destination}")
-    return {"next": decision.destination}
+    logger.debug("Routing to: %s (%s)", destination, reason)
+    # Plain values only: checkpointed state must not carry pydantic models.
+    return {"is_allowed": is_allowed, "destination": destination}
 @traceable
 def call_account(state: MessagesState):
     msg = [SystemMessage(content=ACCOUNT_SYS)] + state['messages']
@@ -114,32 +153,39 @@ def call_block(state: MessagesState):
 
 
 class AgentState(MessagesState):
-    guardian_decision: GuardianOutput
-    next: str
-
-workflow = StateGraph(AgentState)
+    is_allowed: bool
+    destination: str
 
-workflow.add_node("guardian", guardian_node)
-workflow.add_node("router", router_node)
-workflow.add_node("account_bot", call_account)
-workflow.add_node("info_bot", call_info)
-workflow.add_node("block_bot", call_block)
-
-workflow.set_entry_point("guardian")
 @traceable
-def route_guardian(state: AgentState):
-    if state.get("guardian_decision") and state["guardian_decision"].is_allowed:
-        return "router"
+def route_gate(state: AgentState):
+    if state.get("is_allowed"):
+        return state.get("destination", "block_bot")
     return "block_bot"
 
-workflow.add_conditional_edges("guardian", route_guardian, ["router", "block_bot"])
-workflow.add_conditional_edges("router", lambda x: x['next'], ["account_bot", "info_bot"])
 
-workflow.add_edge("account_bot", END)
-workflow.add_edge("info_bot", END)
-workflow.add_edge("block_bot", END)
+@cache
+def get_app_graph():
+    """Builds and compiles the banking graph once per process.
+
+    Conversation state lives in a SQLite checkpointer (STATE_DB, default
+    state.db) so every worker process sees the same session history.
+    """
+    workflow = StateGraph(AgentState)
+
+    workflow.add_node("gate", gate_node)
+    workflow.add_node("account_bot", call_account)
+    workflow.add_node("info_bot", call_info)
+    workflow.add_node("block_bot", call_block)
+
+    workflow.set_entry_point("gate")
+
+    workflow.add_conditional_edges("gate", route_gate, ["account_bot", "info_bot", "block_bot"])
 
-memory = MemorySaver()
+    workflow.add_edge("account_bot", END)
+    workflow.add_edge("info_bot", END)
+    workflow.add_edge("block_bot", END)
 
+    conn = sqlite3.connect(os.environ.get("STATE_DB", "state.db"), check_same_thread=False)
+    memory = SqliteSaver(conn)
 
-app_graph = workflow.compile(checkpointer=memory)
\ No newline at end of file
+    return workflow.compile(checkpointer=memory)
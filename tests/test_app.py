@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("STATE_DB", os.path.join(tempfile.mkdtemp(), "state.db"))
+
+import orjson
+from fastapi.testclient import TestClient
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+import app
+
+
+def fake_graph(reply):
+    """One-node graph whose chat model streams `reply` token by token."""
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content=reply)]))
+
+    def account_bot(state: MessagesState):
+        return {"messages": [llm.invoke(state["messages"])]}
+
+    workflow = StateGraph(MessagesState)
+    workflow.add_node("account_bot", account_bot)
+    workflow.add_edge(START, "account_bot")
+    workflow.add_edge("account_bot", END)
+    return workflow.compile(checkpointer=MemorySaver())
+
+
+def sse_deltas(body):
+    return [
+        orjson.loads(event[len("data: "):])["delta"]
+        for event in body.split("\n\n")
+        if event.startswith("data: ")
+    ]
+
+
+def test_streamed_agent_reply_reaches_client(monkeypatch):
+    reply = "Hello! How can I help with your banking today?"
+    monkeypatch.setattr(app, "app_graph", fake_graph(reply))
+
+    with TestClient(app.app) as client:
+        res = client.post("/chat", json={"message": "hi", "session_id": "test-stream"})
+
+    assert res.headers["content-type"].startswith("text/event-stream")
+    deltas = sse_deltas(res.text)
+    assert "".join(deltas) == reply
+    # Token chunks are forwarded as they arrive, not as one final event.
+    assert len(deltas) > 1
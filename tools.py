@@ -1,5 +1,9 @@
 import csv
 import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from langchain_core.tools import tool
 
 # Helper to get absolute path so it works regardless of where you run python from
@@ -9,51 +13,107 @@ TXNS_CSV = os.path.join(BASE_DIR, 'data', 'transactions.csv')
 
 # --- ACCOUNT TOOLS ---
 
-def get_user_row(user_id):
+def _load_users():
+    """Reads users.csv once into preformatted balance lines keyed by user_id."""
+    balances = {}
     try:
-        with open(USERS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['user_id'] == user_id: return row
-    except FileNotFoundError:
+        with open(USERS_CSV, 'r', newline='', buffering=65536, encoding='utf-8-sig') as f:
+            r = csv.reader(f)
+            header = next(r)
+            i_uid = header.index('user_id')
+            i_bal = header.index('balance')
+            i_at = header.index('account_type')
+            for row in r:
+                if not row:
+                    continue
+                balances[row[i_uid]] = f"Balance: ${row[i_bal]} ({row[i_at]})"
+    except (FileNotFoundError, StopIteration, ValueError):
+        # Missing file, empty file or a header without the expected columns.
+        pass
+    return balances
+
+def _load_txns():
+    """Reads transactions.csv once into each user's last 5 formatted entries (None if missing)."""
+    txns = {}
+    try:
+        with open(TXNS_CSV, 'r', newline='', buffering=65536, encoding='utf-8-sig') as f:
+            r = csv.reader(f)
+            header = next(r)
+            i_uid = header.index('user_id')
+            i_date = header.index('date')
+            i_merchant = header.index('merchant')
+            i_amount = header.index('amount')
+            for row in r:
+                if not row:
+                    continue
+                dq = txns.get(row[i_uid])
+                if dq is None:
+                    dq = txns[row[i_uid]] = deque(maxlen=5)
+                dq.append(f"{row[i_date]}: {row[i_merchant]} (${row[i_amount]})")
+    except (FileNotFoundError, ValueError):
+        # Missing file or a header without the expected columns.
         return None
-    return None
+    except StopIteration:
+        return {}
+    return {user_id: tuple(dq) for user_id, dq in txns.items()}
+
+def _mtimes():
+    mtimes = []
+    for path in (USERS_CSV, TXNS_CSV):
+        try:
+            mtimes.append(os.path.getmtime(path))
+        except OSError:
+            mtimes.append(None)
+    return tuple(mtimes)
+
+def _load_all():
+    global _BALANCE_STR, _LAST5, _LOADED_MTIMES
+    _LOADED_MTIMES = _mtimes()
+    # The two files are independent, so overlap their reads.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fu = ex.submit(_load_users)
+        ft = ex.submit(_load_txns)
+        _BALANCE_STR = fu.result()
+        _LAST5 = ft.result()
+
+_load_all()
+
+def _refresh_if_stale():
+    """Reloads the indexes if a CSV changed on disk."""
+    if _mtimes() != _LOADED_MTIMES:
+        _load_all()
 
 @tool
 def get_my_balance() -> str:
     """Check the balance of the logged-in user."""
-    user_id = "user_101" 
-    user = get_user_row(user_id)
-    if user:
-        return f"Balance: ${user['balance']} ({user['account_type']})"
-    return f"Error: User not found or data/users.csv missing."
+    _refresh_if_stale()
+    return _BALANCE_STR.get("user_101", "Error: User not found or data/users.csv missing.")
 
 @tool
 def get_my_transactions() -> list:
     """Get recent spending history."""
-    user_id = "user_101"
-    txns = []
-    try:
-        with open(TXNS_CSV, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['user_id'] == user_id:
-                    txns.append(f"{row['date']}: {row['merchant']} (${row['amount']})")
-    except FileNotFoundError:
+    _refresh_if_stale()
+    if _LAST5 is None:
         return ["Error: data/transactions.csv not found"]
-    return txns[-5:]
+    return list(_LAST5.get("user_101", ()))
 
 # --- INFO TOOLS ---
 
+_POLICY_MAP = MappingProxyType({
+    "fees": "There is a $5 monthly fee for Checking accounts under $500.",
+    "hours": "Branches are open 9am-5pm Mon-Fri.",
+    "rates": "Savings APY is currently 4.5%."
+})
+_POLICY_RE = re.compile(r'(fees|hours|rates)', re.IGNORECASE | re.ASCII)
+
 @tool
 def get_bank_policies(topic: str) -> str:
     """Retrieves general bank information (fees, hours, rates)."""
-    policies = {
-        "fees": "There is a $5 monthly fee for Checking accounts under $500.",
-        "hours": "Branches are open 9am-5pm Mon-Fri.",
-        "rates": "Savings APY is currently 4.5%."
-    }
-    for key, value in policies.items():
-        if key in topic.lower():
-            return value
-    return "I couldn't find a specific policy on that."
\ No newline at end of file
+    # Bare topics ("fees") are the common case: one hash probe, no scan.
+    policy = _POLICY_MAP.get(topic.strip().lower())
+    if policy is not None:
+        return policy
+    m = _POLICY_RE.search(topic)
+    if m:
+        return _POLICY_MAP[m.group(1).lower()]
+    return "I couldn't find a specific policy on that."